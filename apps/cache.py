@@ -0,0 +1,197 @@
+"""
+Caches for query results.
+
+QueryCache is the in-process cache. Entries are keyed by the SQL text with
+whitespace collapsed plus the query parameters, expire after a TTL and are
+evicted least-recently-used once the cache holds `maxsize` entries.
+
+DiskCache is shared by every worker on an instance. Each result is an Arrow
+IPC file, and a per-key file lock makes sure only one worker runs a given
+query while the others wait for its result. What the workers share is the
+query, not the memory: each one reads the file into its own rows, which its
+QueryCache then holds. 'python -m apps.cache' prints the disk cache's size
+and age.
+"""
+import contextlib
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def make_key(sql: str, params: dict = None) -> tuple:
+    """Normalize `sql` and `params` into a hashable cache key"""
+    normalized = _WHITESPACE.sub(' ', sql).strip()
+    return normalized, tuple(sorted((params or {}).items()))
+
+
+class QueryCache:
+    """Thread-safe TTL + LRU cache with hit/miss/eviction counters."""
+
+    def __init__(self, ttl: float = 3600, maxsize: int = 64):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, max_age: float = None):
+        """
+        Return the cached value for `key`, or None on a miss.
+
+        An entry older than `max_age` counts as a miss but is kept, so other
+        callers go on reading it until it is replaced.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored, value = entry
+            age = time.monotonic() - stored
+            if self.ttl is not None and age > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                self.evictions += 1
+                return None
+            if max_age is not None and age > max_age:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class DiskCache:
+    """Cross-process result cache stored as Arrow IPC files in `directory`."""
+
+    def __init__(self, directory: str, ttl: float = 3600):
+        self.directory = directory
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key) -> str:
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{digest}.arrow')
+
+    def _fresh(self, path, max_age=None) -> bool:
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except OSError:
+            return False
+        limits = [limit for limit in (self.ttl, max_age) if limit is not None]
+        return age <= min(limits, default=age)
+
+    def get(self, key, max_age: float = None):
+        """Return the cached rows for `key`, or None if missing or older than the TTL or `max_age`"""
+        import pyarrow as pa
+        path = self._path(key)
+        if not self._fresh(path, max_age):
+            self.misses += 1
+            return None
+        try:
+            with pa.OSFile(path) as source:
+                rows = pa.ipc.open_file(source).read_all().to_pylist()
+        except (OSError, pa.ArrowInvalid):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return rows
+
+    def set(self, key, rows):
+        """
+        Store `rows`; returns False if they cannot be expressed as Arrow or
+        written (e.g. the disk is full), leaving the previous file in place.
+        """
+        import pyarrow as pa
+        try:
+            table = pa.Table.from_pylist(list(rows))
+        except (pa.ArrowException, TypeError, ValueError):
+            return False
+        path = self._path(key)
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, mode='wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            # readers only ever see a complete file
+            os.replace(tmp, path)
+        except OSError:
+            if tmp is not None:
+                with contextlib.suppress(OSError):
+                    os.remove(tmp)
+            return False
+        return True
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """Hold an exclusive, cross-process lock on `key`"""
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(key) + '.lock', mode='w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        now = time.time()
+        files = [os.path.join(self.directory, name)
+                 for name in os.listdir(self.directory) if name.endswith('.arrow')]
+        ages = [now - os.path.getmtime(path) for path in files]
+        return {
+            'directory': self.directory,
+            'entries': len(files),
+            'bytes': sum(os.path.getsize(path) for path in files),
+            'oldest_age': max(ages, default=None),
+            'newest_age': min(ages, default=None),
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+if __name__ == '__main__':
+    # the in-process QueryCache stats are per worker, this process has none
+    from apps import data
+    print(data.shared_cache.stats() if data.shared_cache else 'shared cache disabled')
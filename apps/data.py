@@ -0,0 +1,326 @@
+"""
+Data access layer shared by the page loaders.
+
+Every loader hands its SQL to `query()` instead of talking to BigQuery
+directly. Results are kept in an in-process TTL + LRU cache (QUERY_CACHE_TTL
+seconds, QUERY_CACHE_SIZE entries) so repeat loads skip the backend. Behind
+it, a disk cache in SHARED_CACHE_DIR is shared by all workers on the
+instance, so only one of them runs each query (set SHARED_CACHE_DIR='' to
+turn it off). Inside `with max_age(seconds):` older entries are fetched
+again, which is how the background refresh replaces data without anyone
+waiting on it.
+
+When neither cache has a result, it is read from the snapshot in
+SNAPSHOT_DIR if the deployment ships one ('python -m apps.snapshot build'),
+so a new instance starts without calling BigQuery. Each query is answered
+from the snapshot at most once per process. Once that entry expires from
+the caches, the backend is queried as usual, so QUERY_CACHE_TTL still bounds
+how old the data gets. The background refresh never reads the snapshot.
+
+The backend is picked with the DATA_BACKEND environment variable:
+
+    DATA_BACKEND=bigquery   (default) runs the SQL as a BigQuery job
+    DATA_BACKEND=duckdb     runs the same SQL with DuckDB against Parquet
+                            copies of the Q1-Q4 tables under DATA_DIR
+
+'python -m apps.data export' writes those Parquet copies from BigQuery.
+"""
+import contextlib
+import json
+import os
+import re
+import tempfile
+import threading
+from dotenv import load_dotenv
+import startup_profile
+from apps.cache import DiskCache, QueryCache, make_key
+
+load_dotenv()
+
+PROJECT = 'dashapp-375513'
+
+# Every table the pages read from, as `dataset.table`
+TABLES = [
+    'Q1_ranked_residential_beats_per_district_2020.arrest_rates_per_beat_2020',
+    'Q2_primary_crime_types.top_5_crime_types_2020',
+    'Q3_domestic_crimes_by_strt_by_ward.top_streets_by_ward',
+    'Q4_crimes_by_time_period.crime_by_time_period',
+]
+
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join('data', 'tables'))
+
+QUERY_CACHE_TTL = float(os.environ.get('QUERY_CACHE_TTL', 3600))
+SHARED_CACHE_DIR = os.environ.get(
+    'SHARED_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'dash-query-cache'))
+
+cache = QueryCache(
+    ttl=QUERY_CACHE_TTL,
+    maxsize=int(os.environ.get('QUERY_CACHE_SIZE', 64)),
+)
+shared_cache = DiskCache(SHARED_CACHE_DIR, ttl=QUERY_CACHE_TTL) if SHARED_CACHE_DIR else None
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', os.path.join('data', 'snapshot'))
+SNAPSHOT_MANIFEST = 'manifest.json'
+
+
+def _load_snapshot(directory=SNAPSHOT_DIR):
+    """(DiskCache, manifest) for the snapshot in `directory`, or (None, {})"""
+    path = os.path.join(directory, SNAPSHOT_MANIFEST) if directory else ''
+    if not os.path.isfile(path):
+        return None, {}
+    with open(path, mode='r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    # the snapshot is as old as the build, it never expires
+    return DiskCache(directory, ttl=None), manifest
+
+
+snapshot, snapshot_manifest = _load_snapshot()
+# set once any result in this process came from the snapshot
+snapshot_used = False
+# cache keys already answered from the snapshot, never answered from it again
+_snapshot_served = set()
+
+
+# ---------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------
+
+
+class BigQueryBackend:
+    """
+    Runs queries as BigQuery jobs.
+
+    Results are streamed over the BigQuery Storage read API when
+    google-cloud-bigquery-storage is installed. Its client uses gRPC, which
+    cannot be started in a process that forks afterwards, so it is created
+    on first use and only while `read_api` is true. The gunicorn master
+    turns it off for its warm-up.
+    """
+
+    name = 'bigquery'
+    read_api = True
+
+    def __init__(self, project=PROJECT):
+        from google.cloud import bigquery
+        self._bigquery = bigquery
+        self.client = bigquery.Client(project=project)
+        self._read_client = None
+        self._read_lock = threading.Lock()
+
+    @property
+    def read_client(self):
+        """BigQuery Storage read client, or None to page results over REST"""
+        if not self.read_api:
+            return None
+        if self._read_client is None:
+            with self._read_lock:
+                if self._read_client is None:
+                    try:
+                        from google.cloud import bigquery_storage
+                    except ImportError:
+                        return None
+                    self._read_client = bigquery_storage.BigQueryReadClient()
+        return self._read_client
+
+    def _job_config(self, params):
+        if not params:
+            return None
+        types = {bool: 'BOOL', int: 'INT64', float: 'FLOAT64', str: 'STRING'}
+        return self._bigquery.QueryJobConfig(query_parameters=[
+            self._bigquery.ScalarQueryParameter(key, types[type(value)], value)
+            for key, value in params.items()
+        ])
+
+    def query(self, sql: str, params: dict = None) -> list:
+        job = self.client.query(sql, job_config=self._job_config(params))
+        # Arrow record batches straight to rowData, no DataFrame in between
+        arrow = job.result().to_arrow(
+            bqstorage_client=self.read_client,
+            create_bqstorage_client=False,
+        )
+        return arrow.to_pylist()
+
+    def export(self, table: str, path: str):
+        """Write a full copy of `dataset.table` to a Parquet file"""
+        import pyarrow.parquet as pq
+        arrow = self.client.query(f"SELECT * FROM `{PROJECT}.{table}`").to_arrow()
+        pq.write_table(arrow, path)
+
+
+class DuckDBBackend:
+    """
+    Runs the loaders' BigQuery SQL locally with DuckDB over Parquet files.
+
+    Only the dialect the loaders use is translated: `project.dataset.table`
+    references, `UNNEST(col) AS alias` joins and `@name` parameters.
+    """
+
+    name = 'duckdb'
+
+    _TABLE = re.compile(r'`(?:[\w-]+\.)?(\w+)\.(\w+)`')
+    _UNNEST = re.compile(r'UNNEST\((\w+)\)\s+AS\s+(\w+)', re.IGNORECASE)
+    _PARAM = re.compile(r'@(\w+)')
+
+    def __init__(self, data_dir=DATA_DIR):
+        import duckdb
+        self.data_dir = data_dir
+        self._con = duckdb.connect(database=':memory:')
+        # DuckDB connections are not safe to share between threads,
+        # each thread gets its own cursor
+        self._local = threading.local()
+
+    def _cursor(self):
+        if not hasattr(self._local, 'cursor'):
+            self._local.cursor = self._con.cursor()
+        return self._local.cursor
+
+    def _path(self, dataset, table):
+        return os.path.join(self.data_dir, dataset, f'{table}.parquet')
+
+    def translate(self, sql: str) -> str:
+        sql = self._TABLE.sub(
+            lambda m: f"read_parquet('{self._path(m.group(1), m.group(2))}')", sql)
+        # a correlated subquery keeps the alias from clashing with the
+        # array column and exposes the struct fields as alias.field
+        sql = self._UNNEST.sub(r'(SELECT UNNEST(\1, recursive := true)) AS \2', sql)
+        return self._PARAM.sub(r'$\1', sql)
+
+    def query(self, sql: str, params: dict = None) -> list:
+        cursor = self._cursor()
+        cursor.execute(self.translate(sql), params or {})
+        return cursor.arrow().to_pylist()
+
+
+BACKENDS = {
+    'bigquery': BigQueryBackend,
+    'duckdb': DuckDBBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide backend, creating it on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = os.environ.get('DATA_BACKEND', 'bigquery').lower()
+                if name not in BACKENDS:
+                    raise ValueError(
+                        f"Unknown DATA_BACKEND {name!r}, expected one of {sorted(BACKENDS)}")
+                _backend = BACKENDS[name]()
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the backend, e.g. to point benchmarks at a DuckDBBackend"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def max_age(seconds: float):
+    """
+    Within the block, treat cached results older than `seconds` as misses.
+
+    Other threads keep reading the old entries until the new results
+    replace them.
+    """
+    previous = getattr(_local, 'max_age', None)
+    _local.max_age = seconds
+    try:
+        yield
+    finally:
+        _local.max_age = previous
+
+
+@contextlib.contextmanager
+def sources():
+    """Collect where the queries in the block were answered from ('snapshot')"""
+    previous = getattr(_local, 'sources', None)
+    _local.sources = found = set()
+    try:
+        yield found
+    finally:
+        _local.sources = previous
+
+
+def query(sql: str, params: dict = None) -> list:
+    """
+    Return AgGrid rowData for `sql`, from the cache when possible.
+
+    The cached list is shared between callers and must not be mutated.
+    """
+    key = make_key(sql, params)
+    age = getattr(_local, 'max_age', None)
+    rows = cache.get(key, age)
+    if rows is None:
+        rows = _shared_query(key, sql, params, age)
+        cache.set(key, rows)
+    return rows
+
+
+def _run(sql, params):
+    backend = get_backend()
+    with startup_profile.phase(f'{backend.name} query'):
+        return backend.query(sql, params)
+
+
+def _from_snapshot(key):
+    global snapshot_used
+    if key in _snapshot_served:
+        return None
+    rows = snapshot.get(key)
+    if rows is not None:
+        _snapshot_served.add(key)
+        snapshot_used = True
+        found = getattr(_local, 'sources', None)
+        if found is not None:
+            found.add('snapshot')
+    return rows
+
+
+def _shared_query(key, sql, params, age=None):
+    if shared_cache is not None:
+        rows = shared_cache.get(key, age)
+        if rows is not None:
+            return rows
+    if age is None and snapshot is not None:
+        rows = _from_snapshot(key)
+        if rows is not None:
+            return rows
+    if shared_cache is None:
+        return _run(sql, params)
+    with shared_cache.lock(key):
+        # another worker may have run it while this one waited
+        rows = shared_cache.get(key, age)
+        if rows is None:
+            rows = _run(sql, params)
+            # if it cannot be stored, this worker still answers from memory
+            shared_cache.set(key, rows)
+    return rows
+
+
+def export_tables(data_dir=DATA_DIR):
+    """Copy every table in TABLES from BigQuery to Parquet under `data_dir`"""
+    backend = BigQueryBackend()
+    for table in TABLES:
+        dataset, name = table.split('.')
+        os.makedirs(os.path.join(data_dir, dataset), exist_ok=True)
+        path = os.path.join(data_dir, dataset, f'{name}.parquet')
+        backend.export(table, path)
+        print(f'{table} -> {path}')
+
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:] == ['export']:
+        export_tables()
+    else:
+        print('usage: python -m apps.data export')
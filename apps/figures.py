@@ -0,0 +1,93 @@
+"""
+Memoized figure builders for the Q1 beat maps.
+
+A map is fully determined by its rows, the geometry level and the selected
+row. The Plotly figure is built and validated once per (dataset version,
+level) and kept as a plain dict. Each selection then copies that base and
+swaps in its opacity array, and the result is cached too, so repeat views
+and clicks never construct Plotly objects.
+"""
+import hashlib
+import json
+import plotly.graph_objects as go
+from apps import geo
+from apps.cache import QueryCache
+
+MAP_ZOOM = 9.7
+MAP_CENTER = {'lat': 41.86, 'lon': -87.69}
+
+figures = QueryCache(ttl=None, maxsize=64)
+
+
+def dataset_version(rows) -> str:
+    """Content hash of rowData, stable across workers and restarts"""
+    body = json.dumps(rows, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(body).hexdigest()[:16]
+
+
+def _opacity(n, selected):
+    if selected is None:
+        return [.5] * n
+    opacity = [.1] * n
+    opacity[selected] = .5
+    return opacity
+
+
+def _base_figure(rows, prefix, level, highlight_lines):
+    locations = [row['beat_key'] for row in rows]
+    fig = go.Figure(
+        go.Choroplethmapbox(
+            geojson=geo.geojson_url('police_beats', level, keys=locations),
+            featureidkey='properties.beat_num',
+            locations=locations,
+            z=[row[f'{prefix}_arrest_rate'] for row in rows],
+            colorscale='Viridis',
+            zmin=0,
+            zmax=.4,
+            marker_opacity=_opacity(len(rows), None),
+            marker_line_width=_opacity(len(rows), None) if highlight_lines else .1,
+            text=[str(row['district']) for row in rows],
+            hovertemplate =
+                "District: <b>%{text} </b><br>" +
+                "Beat: <b>%{location} </b><br>" +
+                "Arrest Rate: <b>%{z:.2%} </b><br><extra></extra>"
+        )
+    )
+
+    # Set map layout
+    fig.update_layout(
+        mapbox_style='carto-positron',
+        mapbox_zoom=MAP_ZOOM,
+        # keep the user's pan and zoom when the figure is rebuilt
+        uirevision='beats',
+        mapbox_center=MAP_CENTER,
+        height=900,
+        width=800
+    )
+    return fig.to_plotly_json()
+
+
+def beat_map(rows, prefix, level, selected=None, highlight_lines=False) -> dict:
+    """
+    Choropleth of `rows` ({prefix}_arrest_rate by beat_key) as a figure dict.
+
+    `selected` is the grid rowIndex to highlight. With `highlight_lines` the
+    outline widths follow the selection as well as the opacity.
+    """
+    base_key = (prefix, dataset_version(rows), level, highlight_lines)
+    key = base_key + (selected,)
+    fig = figures.get(key)
+    if fig is not None:
+        return fig
+    base = figures.get(base_key)
+    if base is None:
+        base = _base_figure(rows, prefix, level, highlight_lines)
+        figures.set(base_key, base)
+    trace = base['data'][0]
+    opacity = _opacity(len(rows), selected)
+    marker = dict(trace['marker'], opacity=opacity)
+    if highlight_lines:
+        marker['line'] = dict(marker['line'], width=opacity)
+    fig = dict(base, data=[dict(trace, marker=marker)])
+    figures.set(key, fig)
+    return fig
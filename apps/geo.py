@@ -0,0 +1,185 @@
+"""
+Boundary geometry for the maps, served once as a cacheable resource.
+
+Figures reference the geometry by URL (plotly.js fetches GeoJSON given as a
+string) instead of embedding it, so callback responses only carry the
+locations, z values and styling. The URL carries a content hash: a matching
+request is cached for a year, anything else is revalidated with the ETag.
+
+Simplified levels built by 'python -m apps.geometry build' are picked per
+map zoom. The GeoJSON is decoded from the memory-mapped binary store of a
+level (see apps/geometry.py), only for the features a response needs, so
+workers hold no parsed geometry. /geo/<name>.topojson serves the TopoJSON
+file, which stores shared borders once. If the store has not been built,
+the GeoJSON is decoded from the topology instead. If that has not been built
+either, the topology is encoded from the source at first use and the full
+geometry is served for every level.
+"""
+import functools
+import hashlib
+import json
+import os
+import threading
+import flask
+import serializer
+import startup_profile
+from apps.geometry import (
+    LEVELS, GeometryStore, decode_topology, encode_topology, level_path, store_path,
+)
+from main import server
+
+GEOMETRY = {
+    'police_beats': 'police_beats.geojson',
+    'wards': 'wards.geojson',
+}
+
+# property each map matches its locations against (the trace featureidkey)
+FEATURE_KEYS = {
+    'police_beats': 'beat_num',
+    'wards': 'ward',
+}
+
+FORMATS = ('geojson', 'topojson')
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+# zoom below which each simplified level is used, coarsest first
+ZOOM_LEVELS = [(11, 'low'), (13, 'medium'), (15, 'high')]
+
+_topologies = {}
+_stores = {}
+_indexes = {}
+_resources = {}
+_lock = threading.RLock()
+
+
+def topology(name: str, level: str = 'full') -> dict:
+    """Parsed topology for `name` at `level`, loaded on first use"""
+    key = (name, level)
+    if key not in _topologies:
+        with _lock:
+            if key not in _topologies:
+                path = level_path(name, level)
+                if os.path.exists(path):
+                    with startup_profile.phase(f'geometry {name} {level}'), \
+                            open(path, mode='r', encoding='utf-8') as f:
+                        _topologies[key] = json.load(f)
+                elif level != 'full':
+                    _topologies[key] = topology(name, 'full')
+                else:
+                    with startup_profile.phase(f'geometry {name} from {GEOMETRY[name]}'), \
+                            open(GEOMETRY[name], mode='r', encoding='utf-8') as f:
+                        _topologies[key] = encode_topology(json.load(f), name)
+    return _topologies[key]
+
+
+def store(name: str, level: str = 'full'):
+    """Memory-mapped GeometryStore for `name` at `level`, or None if not built"""
+    key = (name, level)
+    if key not in _stores:
+        with _lock:
+            if key not in _stores:
+                path = store_path(name, level)
+                if os.path.exists(path):
+                    with startup_profile.phase(f'geometry store {name} {level}'):
+                        _stores[key] = GeometryStore(path)
+                else:
+                    _stores[key] = None
+    return _stores[key]
+
+
+def feature_index(name: str, level: str = 'full') -> dict:
+    """
+    FEATURE_KEYS value -> feature, built once per level.
+
+    A feature is its number in the binary store, or its topology geometry
+    when the store has not been built.
+    """
+    key = (name, level)
+    if key not in _indexes:
+        field = FEATURE_KEYS[name]
+        binary = store(name, level)
+        if binary is not None:
+            _indexes[key] = {properties[field]: i for i, properties in enumerate(binary.properties)}
+        else:
+            geometries = topology(name, level)['objects'][name]['geometries']
+            _indexes[key] = {geometry['properties'][field]: geometry for geometry in geometries}
+    return _indexes[key]
+
+
+def _serialize(value):
+    body = serializer.dumps(value)
+    return body, hashlib.sha1(body).hexdigest()
+
+
+def _resource(name, level='full', fmt='geojson'):
+    """Return (body, etag) for a geometry response, serializing it on first use"""
+    key = (name, level, fmt)
+    if key not in _resources:
+        with _lock:
+            if key not in _resources:
+                binary = store(name, level)
+                if fmt == 'geojson' and binary is not None:
+                    _resources[key] = _serialize(binary.feature_collection())
+                elif fmt == 'geojson':
+                    _resources[key] = _serialize(decode_topology(topology(name, level), name))
+                else:
+                    _resources[key] = _serialize(topology(name, level))
+    return _resources[key]
+
+
+@functools.lru_cache(maxsize=32)
+def _subset(name, level, keys):
+    """(body, etag) of a GeoJSON FeatureCollection holding only `keys`"""
+    index = feature_index(name, level)
+    features = [index[key] for key in keys if key in index]
+    binary = store(name, level)
+    if binary is not None:
+        return _serialize(binary.feature_collection(features))
+    return _serialize(decode_topology(topology(name, level), name, features))
+
+
+def level_for_zoom(zoom: float) -> str:
+    """Coarsest geometry level that still looks right at `zoom`"""
+    for max_zoom, level in ZOOM_LEVELS:
+        if zoom < max_zoom:
+            return level
+    return 'full'
+
+
+def _keys(keys):
+    return tuple(sorted(set(keys)))
+
+
+def geojson_url(name: str, level: str = 'full', keys=None) -> str:
+    """
+    URL of the GeoJSON route for `name`, versioned by content.
+
+    With `keys`, the URL only returns the features whose FEATURE_KEYS value
+    is listed, which is all a choropleth that plots those locations needs.
+    """
+    if keys is None:
+        _, etag = _resource(name, level)
+        return f'/geo/{name}.geojson?level={level}&v={etag[:12]}'
+    keys = _keys(keys)
+    _, etag = _subset(name, level, keys)
+    return f"/geo/{name}.geojson?level={level}&keys={','.join(keys)}&v={etag[:12]}"
+
+
+@server.route('/geo/<name>.<fmt>')
+def serve_geometry(name, fmt):
+    level = flask.request.args.get('level', 'full')
+    if name not in GEOMETRY or fmt not in FORMATS or (level != 'full' and level not in LEVELS):
+        flask.abort(404)
+    keys = flask.request.args.get('keys')
+    if keys and fmt == 'geojson':
+        body, etag = _subset(name, level, _keys(keys.split(',')))
+    else:
+        body, etag = _resource(name, level, fmt)
+    response = flask.Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    if flask.request.args.get('v') == etag[:12]:
+        response.headers['Cache-Control'] = f'public, max-age={ONE_YEAR}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(flask.request)
@@ -0,0 +1,471 @@
+"""
+Offline preprocessing for the beat and ward boundary files.
+
+Coordinates are quantized to PRECISION decimals and every polygon ring is
+simplified with Douglas-Peucker at several tolerances. To keep neighbouring
+polygons from pulling apart, rings are first cut into chains at junctions
+(vertices shared by three or more edges). A border shared by two polygons is
+then the same chain in both, and is simplified once and reused, so both
+sides stay identical.
+
+The same chains are stored once each as TopoJSON arcs, so borders shared by
+adjacent polygons are not written twice.
+
+For serving, each level is also written as a binary store: float32
+coordinates, offset arrays from features to polygons to rings to points, and
+a JSON properties table. GeometryStore memory-maps it, so loading costs no
+parsing and the coordinates stay in the page cache, shared by every worker,
+until a feature is turned into GeoJSON.
+
+'python -m apps.geometry build' writes data/geo/<name>.<level>.topojson and
+data/geo/<name>.<level>.geom for every level in LEVELS plus an unsimplified
+'full' level.
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+PRECISION = 6
+
+# level -> Douglas-Peucker tolerance in degrees (1e-4 deg is about 10 m here)
+LEVELS = {
+    'low': 3e-4,
+    'medium': 6e-5,
+    'high': 1e-5,
+}
+
+SOURCES = {
+    'police_beats': 'police_beats.geojson',
+    'wards': 'wards.geojson',
+}
+
+OUTPUT_DIR = os.path.join('data', 'geo')
+
+
+# ---------------------------------------------------------------------
+# Rings and chains
+# ---------------------------------------------------------------------
+
+
+def quantize(ring, precision=PRECISION):
+    """Round a ring's coordinates and drop repeated points (keeps it open)"""
+    points = []
+    for x, y in ring:
+        point = (round(x, precision), round(y, precision))
+        if not points or point != points[-1]:
+            points.append(point)
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+
+def iter_rings(geometry):
+    if geometry['type'] == 'Polygon':
+        polygons = [geometry['coordinates']]
+    else:
+        polygons = geometry['coordinates']
+    for polygon in polygons:
+        yield from polygon
+
+
+def find_junctions(rings):
+    """Vertices with more than two distinct neighbours across all rings"""
+    neighbours = {}
+    for ring in rings:
+        n = len(ring)
+        for i, point in enumerate(ring):
+            adjacent = neighbours.setdefault(point, set())
+            adjacent.add(ring[i - 1])
+            adjacent.add(ring[(i + 1) % n])
+    return {point for point, adjacent in neighbours.items() if len(adjacent) > 2}
+
+
+def split_ring(ring, junctions):
+    """
+    Cut an open ring into chains that start and end on junctions.
+
+    A ring without junctions becomes one closed chain.
+    """
+    cuts = [i for i, point in enumerate(ring) if point in junctions]
+    if not cuts:
+        # start at the smallest point so the same ring always splits the same way
+        start = ring.index(min(ring))
+        return [ring[start:] + ring[:start + 1]]
+    start = cuts[0]
+    rotated = ring[start:] + ring[:start]
+    cuts = [i - start for i in cuts] + [len(ring)]
+    rotated.append(rotated[0])
+    return [rotated[a:b + 1] for a, b in zip(cuts, cuts[1:])]
+
+
+# ---------------------------------------------------------------------
+# Simplification
+# ---------------------------------------------------------------------
+
+
+def _distance(point, start, end):
+    (x, y), (x1, y1), (x2, y2) = point, start, end
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 0 and dy == 0:
+        return math.hypot(x - x1, y - y1)
+    t = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+
+
+def douglas_peucker(points, tolerance):
+    """Simplify an open polyline, keeping both endpoints"""
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        index, furthest = first, -1.0
+        for i in range(first + 1, last):
+            d = _distance(points[i], points[first], points[last])
+            if d > furthest:
+                index, furthest = i, d
+        if furthest > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplify_chain(chain, tolerance):
+    """Douglas-Peucker that gives the same points whichever way a chain runs"""
+    forward = chain[0] < chain[-1] or (chain[0] == chain[-1] and chain[1] <= chain[-2])
+    canonical = chain if forward else chain[::-1]
+    if canonical[0] == canonical[-1]:
+        # closed ring with no junctions: pin its farthest point as well
+        far = max(range(len(canonical)), key=lambda i: _distance(canonical[i], canonical[0], canonical[0]))
+        simplified = (douglas_peucker(canonical[:far + 1], tolerance)[:-1]
+                      + douglas_peucker(canonical[far:], tolerance))
+    else:
+        simplified = douglas_peucker(canonical, tolerance)
+    return simplified if forward else simplified[::-1]
+
+
+def simplify_collection(collection, tolerance, precision=PRECISION):
+    """Return a simplified copy of a FeatureCollection with shared borders intact"""
+    rings = [quantize(ring, precision)
+             for feature in collection['features']
+             for ring in iter_rings(feature['geometry'])]
+    junctions = find_junctions(rings)
+    memo = {}
+
+    def simplify_ring(ring):
+        out = []
+        for chain in split_ring(ring, junctions):
+            key = tuple(chain)
+            if key not in memo:
+                memo[key] = simplify_chain(chain, tolerance)
+            out.extend(memo[key] if not out else memo[key][1:])
+        if len(set(out)) < 3:
+            # collapsed below a triangle, keep the unsimplified ring
+            out = ring + [ring[0]]
+        return [list(point) for point in out]
+
+    features = []
+    ring_iter = iter(rings)
+    for feature in collection['features']:
+        geometry = feature['geometry']
+        polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        coordinates = [[simplify_ring(next(ring_iter)) for _ in polygon] for polygon in polygons]
+        features.append({
+            'type': 'Feature',
+            'properties': feature['properties'],
+            'geometry': {
+                'type': geometry['type'],
+                'coordinates': coordinates[0] if geometry['type'] == 'Polygon' else coordinates,
+            },
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+# ---------------------------------------------------------------------
+# Topology
+# ---------------------------------------------------------------------
+
+
+def encode_topology(collection, name, precision=PRECISION):
+    """
+    Encode a Polygon/MultiPolygon FeatureCollection as TopoJSON.
+
+    Rings are split into the same junction-to-junction chains used for
+    simplification and each chain is stored once as an arc. Arc coordinates
+    are integers on a 10**-precision grid, delta-encoded after the first
+    point. A ring refers to an arc by index, or by ~index when it runs the
+    arc backwards, as in the TopoJSON spec.
+    """
+    rings = [quantize(ring, precision)
+             for feature in collection['features']
+             for ring in iter_rings(feature['geometry'])]
+    junctions = find_junctions(rings)
+    scale = 10 ** -precision
+    x0 = min(x for ring in rings for x, _ in ring)
+    y0 = min(y for ring in rings for _, y in ring)
+
+    arcs = []
+    index = {}
+
+    def arc_id(chain):
+        key = tuple(chain)
+        if key in index:
+            return index[key]
+        reverse = key[::-1]
+        if reverse in index:
+            return ~index[reverse]
+        index[key] = len(arcs)
+        grid = [(round((x - x0) / scale), round((y - y0) / scale)) for x, y in chain]
+        arcs.append([list(grid[0])] + [[x - px, y - py] for (px, py), (x, y) in zip(grid, grid[1:])])
+        return index[key]
+
+    geometries = []
+    ring_iter = iter(rings)
+    for feature in collection['features']:
+        geometry = feature['geometry']
+        polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        refs = [[[arc_id(chain) for chain in split_ring(next(ring_iter), junctions)]
+                 for _ in polygon] for polygon in polygons]
+        geometries.append({
+            'type': geometry['type'],
+            'properties': feature['properties'],
+            'arcs': refs[0] if geometry['type'] == 'Polygon' else refs,
+        })
+    return {
+        'type': 'Topology',
+        'transform': {'scale': [scale, scale], 'translate': [x0, y0]},
+        'objects': {name: {'type': 'GeometryCollection', 'geometries': geometries}},
+        'arcs': arcs,
+    }
+
+
+def _arc_decoder(topology):
+    """Return a function that decodes arc i to coordinates, memoizing each arc"""
+    (sx, sy), (tx, ty) = topology['transform']['scale'], topology['transform']['translate']
+    digits = round(-math.log10(min(sx, sy)))
+    decoded = {}
+
+    def arc(i):
+        if i not in decoded:
+            x = y = 0
+            points = []
+            for dx, dy in topology['arcs'][i]:
+                x += dx
+                y += dy
+                points.append([round(x * sx + tx, digits), round(y * sy + ty, digits)])
+            decoded[i] = points
+        return decoded[i]
+    return arc
+
+
+def decode_topology(topology, name, geometries=None):
+    """
+    Decode one object of a topology back to a GeoJSON FeatureCollection.
+
+    `geometries` optionally limits the decode to some of the object's
+    geometries, so only the features a figure plots are materialized. Arcs
+    are decoded on demand, so a partial decode only touches the arcs it needs.
+    """
+    arc = _arc_decoder(topology)
+
+    def ring(refs):
+        points = []
+        for ref in refs:
+            coords = arc(ref) if ref >= 0 else arc(~ref)[::-1]
+            points.extend(coords if not points else coords[1:])
+        return points
+
+    if geometries is None:
+        geometries = topology['objects'][name]['geometries']
+    features = []
+    for geometry in geometries:
+        if geometry['type'] == 'Polygon':
+            coordinates = [ring(refs) for refs in geometry['arcs']]
+        else:
+            coordinates = [[ring(refs) for refs in polygon] for polygon in geometry['arcs']]
+        features.append({
+            'type': 'Feature',
+            'properties': geometry['properties'],
+            'geometry': {'type': geometry['type'], 'coordinates': coordinates},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+# ---------------------------------------------------------------------
+# Binary store
+# ---------------------------------------------------------------------
+
+# magic, version, precision, features, polygons, rings, points, properties bytes
+_HEADER = struct.Struct('<4sHHIIIII')
+_MAGIC = b'GEOM'
+_VERSION = 1
+_GEOMETRY_TYPES = ['Polygon', 'MultiPolygon']
+
+
+def _align(offset, size=8):
+    return -(-offset // size) * size
+
+
+def write_store(collection, path, precision=PRECISION):
+    """Write a Polygon/MultiPolygon FeatureCollection as a binary store"""
+    types = array('B')
+    feature_parts, part_rings, ring_points = array('I', [0]), array('I', [0]), array('I', [0])
+    coords = array('f')
+    properties = []
+    for feature in collection['features']:
+        geometry = feature['geometry']
+        polygons = geometry['coordinates']
+        if geometry['type'] == 'Polygon':
+            polygons = [polygons]
+        types.append(_GEOMETRY_TYPES.index(geometry['type']))
+        for polygon in polygons:
+            for ring in polygon:
+                for point in ring:
+                    coords.extend(point[:2])
+                ring_points.append(len(coords) // 2)
+            part_rings.append(len(ring_points) - 1)
+        feature_parts.append(len(part_rings) - 1)
+        properties.append(feature['properties'])
+    table = json.dumps(properties, separators=(',', ':')).encode('utf-8')
+    sections = [types, feature_parts, part_rings, ring_points, coords]
+    if sys.byteorder != 'little':
+        for section in sections[1:]:
+            section.byteswap()
+    with open(path, mode='wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, precision, len(types), len(part_rings) - 1,
+                             len(ring_points) - 1, len(coords) // 2, len(table)))
+        for body in [*(section.tobytes() for section in sections), table]:
+            f.write(b'\0' * (_align(f.tell()) - f.tell()))
+            f.write(body)
+
+
+class GeometryStore:
+    """
+    Read-only, memory-mapped view of a file written by write_store.
+
+    Features are numbered in file order; `properties[i]` holds feature i's
+    properties. Coordinates are only turned into Python objects by
+    feature_collection() and outlines(), for the features asked for.
+    """
+
+    def __init__(self, path):
+        with open(path, mode='rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, version, self.precision, n_features, n_parts, n_rings, n_points, table_size = \
+            _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f'{path} is not a version {_VERSION} geometry store')
+        offset = _HEADER.size
+
+        def section(fmt, count):
+            nonlocal offset
+            start = _align(offset)
+            size = count * struct.calcsize(fmt)
+            offset = start + size
+            values = view[start:offset].cast(fmt)
+            if sys.byteorder != 'little' and fmt != 'B':
+                values = array(fmt, values)
+                values.byteswap()
+            return values
+
+        self._types = section('B', n_features)
+        self._feature_parts = section('I', n_features + 1)
+        self._part_rings = section('I', n_parts + 1)
+        self._ring_points = section('I', n_rings + 1)
+        self._coords = section('f', 2 * n_points)
+        start = _align(offset)
+        self.properties = json.loads(bytes(view[start:start + table_size]))
+
+    def __len__(self):
+        return len(self.properties)
+
+    def _ring(self, r):
+        start, end = self._ring_points[r], self._ring_points[r + 1]
+        values = iter(self._coords[2 * start:2 * end].tolist())
+        digits = self.precision
+        return [[round(x, digits), round(y, digits)] for x, y in zip(values, values)]
+
+    def _polygon(self, p):
+        return [self._ring(r) for r in range(self._part_rings[p], self._part_rings[p + 1])]
+
+    def feature(self, i) -> dict:
+        parts = range(self._feature_parts[i], self._feature_parts[i + 1])
+        kind = _GEOMETRY_TYPES[self._types[i]]
+        if kind == 'Polygon':
+            coordinates = self._polygon(parts[0])
+        else:
+            coordinates = [self._polygon(p) for p in parts]
+        return {
+            'type': 'Feature',
+            'properties': self.properties[i],
+            'geometry': {'type': kind, 'coordinates': coordinates},
+        }
+
+    def feature_collection(self, indices=None) -> dict:
+        """GeoJSON FeatureCollection of `indices` (default: every feature)"""
+        if indices is None:
+            indices = range(len(self))
+        return {'type': 'FeatureCollection', 'features': [self.feature(i) for i in indices]}
+
+    def outlines(self, indices=None):
+        """(lons, lats) of every ring of `indices`, None-separated for a Plotly line trace"""
+        if indices is None:
+            indices = range(len(self))
+        lons, lats = [], []
+        for i in indices:
+            first = self._part_rings[self._feature_parts[i]]
+            last = self._part_rings[self._feature_parts[i + 1]]
+            for r in range(first, last):
+                ring = self._ring(r)
+                lons.extend([x for x, _ in ring] + [None])
+                lats.extend([y for _, y in ring] + [None])
+        return lons, lats
+
+
+# ---------------------------------------------------------------------
+# Build
+# ---------------------------------------------------------------------
+
+
+def level_path(name: str, level: str) -> str:
+    return os.path.join(OUTPUT_DIR, f'{name}.{level}.topojson')
+
+
+def store_path(name: str, level: str) -> str:
+    return os.path.join(OUTPUT_DIR, f'{name}.{level}.geom')
+
+
+def build(output_dir=OUTPUT_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+    for name, source in SOURCES.items():
+        with open(source, mode='r', encoding='utf-8') as f:
+            collection = json.load(f)
+        levels = dict(LEVELS, full=None)
+        for level, tolerance in levels.items():
+            simplified = collection if tolerance is None else simplify_collection(collection, tolerance)
+            topology = encode_topology(simplified, name)
+            path = os.path.join(output_dir, f'{name}.{level}.topojson')
+            with open(path, mode='w', encoding='utf-8') as f:
+                json.dump(topology, f, separators=(',', ':'))
+            print(f'{path}: {os.path.getsize(path) / 1024:.0f} KB')
+            # from the decoded topology, so both hold the same quantized points
+            path = os.path.join(output_dir, f'{name}.{level}.geom')
+            write_store(decode_topology(topology, name), path)
+            print(f'{path}: {os.path.getsize(path) / 1024:.0f} KB')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['build']:
+        build()
+    else:
+        print('usage: python -m apps.geometry build')
@@ -2,10 +2,14 @@ import os
 from dash import html, dcc
 import dash_bootstrap_components as dbc
 from main import app
+from optimize_assets import optimized
+import fingerprint
 from dotenv import load_dotenv
 
 load_dotenv()
 
+CARD_IMAGE = fingerprint.url(optimized("/static/images/channel.png"))
+
 
 # Dummy page to get started.
 layout = dbc.Container([
@@ -41,7 +45,7 @@ layout = dbc.Container([
         dbc.Col(
             dbc.Card(
                 [
-                    dbc.CardImg(src="/static/images/channel.png", top=True, style={'opacity': '0.05'}),
+                    dbc.CardImg(src=CARD_IMAGE, top=True, style={'opacity': '0.05'}),
                     dbc.CardImgOverlay(
                     dbc.CardBody(
                         [
@@ -84,7 +88,7 @@ layout = dbc.Container([
         dbc.Col([
             dbc.Card(
                 [
-                    dbc.CardImg(src="/static/images/channel.png", top=True, style={'opacity': '0.05'}),
+                    dbc.CardImg(src=CARD_IMAGE, top=True, style={'opacity': '0.05'}),
                     dbc.CardImgOverlay(
                         dbc.CardBody(
                             [
@@ -135,7 +139,7 @@ layout = dbc.Container([
         dbc.Col(
             dbc.Card(
                 [
-                    dbc.CardImg(src="/static/images/channel.png", top=True, style={'opacity': '0.05'}),
+                    dbc.CardImg(src=CARD_IMAGE, top=True, style={'opacity': '0.05'}),
                     dbc.CardImgOverlay(
                         dbc.CardBody(
                         [
@@ -177,7 +181,7 @@ layout = dbc.Container([
         dbc.Col(
             dbc.Card(
                 [
-                    dbc.CardImg(src="/static/images/channel.png", top=True, style={'opacity': '0.05'}),
+                    dbc.CardImg(src=CARD_IMAGE, top=True, style={'opacity': '0.05'}),
                     dbc.CardImgOverlay(
                         dbc.CardBody(
                             [
@@ -0,0 +1,97 @@
+"""
+Warm the query cache for every dataset the pages show.
+
+The loaders run concurrently in a bounded thread pool, so warm-up takes as
+long as the slowest query rather than the sum of all of them. Each loader
+goes through data.query, which fills the shared cache as a side effect.
+`refreshed` records when each dataset was last loaded successfully, or when
+the snapshot was built for a dataset read from it.
+
+'python -m apps.prefetch' prints the per-dataset timings.
+"""
+import importlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import startup_profile
+
+# dataset name -> (module, loader, args)
+DATASETS = {
+    'Q1 beats': ('apps.page1', 'load_beat_data', ()),
+    'Q2 crime types': ('apps.page2', 'load_crime_type_data', ()),
+    'Q3 top streets': ('apps.page3', 'load_top_streets', ()),
+    'Q4 time periods': ('apps.page4', 'load_time_data', ()),
+}
+
+MAX_WORKERS = int(os.environ.get('PREFETCH_WORKERS', 8))
+
+# dataset name -> time.time() of its last successful load
+refreshed = {}
+
+
+def _loader(name):
+    module, function, args = DATASETS[name]
+    loader = getattr(importlib.import_module(module), function)
+    return lambda: loader(*args)
+
+
+def _timed(name, load, max_age=None):
+    from apps import data
+    start = time.perf_counter()
+    with data.max_age(max_age), data.sources() as sources, startup_profile.phase(f'load {name}'):
+        load()
+    if 'snapshot' in sources:
+        refreshed[name] = data.snapshot_manifest.get('built_at', time.time())
+    else:
+        refreshed[name] = time.time()
+    return time.perf_counter() - start
+
+
+def prefetch(names=None, max_workers=MAX_WORKERS, max_age=None) -> dict:
+    """
+    Load `names` (default: every dataset) concurrently.
+
+    With `max_age`, cached results older than that many seconds are fetched
+    again. Returns {name: seconds} for the loaders that succeeded. Failures
+    are printed and left out, so the page falls back to loading on demand.
+    """
+    names = list(DATASETS if names is None else names)
+    # Import the page modules up front, importing from several threads at
+    # once would serialize on the import lock anyway
+    loaders = {name: _loader(name) for name in names}
+    timings = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch') as pool:
+        futures = {name: pool.submit(_timed, name, load, max_age) for name, load in loaders.items()}
+        for name, future in futures.items():
+            try:
+                timings[name] = future.result()
+            except Exception as err:
+                print(f'prefetch {name} failed: {err!r}')
+    return timings
+
+
+def warm(max_workers=MAX_WORKERS) -> dict:
+    """
+    Fill every process-level cache the pages read from: the datasets and
+    the geometry feature index at each level. Returns the prefetch timings.
+    """
+    from apps import geo
+    from apps.geometry import LEVELS
+    timings = prefetch(max_workers=max_workers)
+    for name in geo.GEOMETRY:
+        for level in ['full', *LEVELS]:
+            geo.feature_index(name, level)
+    return timings
+
+
+def report(timings: dict, total: float = None) -> str:
+    lines = [f'{name:<24} {seconds * 1000:8.1f} ms' for name, seconds in timings.items()]
+    if total is not None:
+        lines.append(f"{'total (wall clock)':<24} {total * 1000:8.1f} ms")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    result = prefetch()
+    print(report(result, time.perf_counter() - start))
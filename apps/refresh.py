@@ -0,0 +1,65 @@
+"""
+Background refresh of the Q1-Q4 datasets (stale-while-revalidate).
+
+start() runs a daemon thread that reloads every dataset each
+REFRESH_INTERVAL seconds (default 900, 0 turns it off). Requests keep
+reading the cached version while a refresh runs. A new result replaces the
+old one in a single cache write, and the pages pick it up on their next
+visit. If a refresh fails, the previous data is served until
+QUERY_CACHE_TTL, so keep the interval well below the TTL.
+
+Every worker runs its own thread. A result another worker refreshed within
+the last half interval is read from the shared disk cache instead of being
+queried again.
+
+Data read from the build-time snapshot is revalidated sooner, after
+SNAPSHOT_REVALIDATE_AFTER seconds (default 60).
+"""
+import os
+import threading
+from apps import data, prefetch
+
+INTERVAL = float(os.environ.get('REFRESH_INTERVAL', 900))
+SNAPSHOT_REVALIDATE_AFTER = float(os.environ.get('SNAPSHOT_REVALIDATE_AFTER', 60))
+
+_thread = None
+_lock = threading.Lock()
+
+
+def refresh(interval=INTERVAL) -> dict:
+    """Reload every dataset older than half of `interval`; returns the timings"""
+    return prefetch.prefetch(max_age=interval / 2)
+
+
+def _run(interval, stop):
+    if not prefetch.refreshed:
+        # nothing was warmed at startup (e.g. 'python index.py'), load right away
+        prefetch.prefetch()
+    wait = min(SNAPSHOT_REVALIDATE_AFTER, interval) if data.snapshot_used else interval
+    while not stop.wait(wait):
+        try:
+            refresh(wait)
+        except Exception as err:
+            print(f'refresh failed: {err!r}')
+        wait = interval
+
+
+def start(interval=INTERVAL):
+    """Start the refresh thread for this process, once. Returns it, or None if off"""
+    global _thread
+    if interval <= 0:
+        return None
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            stop = threading.Event()
+            _thread = threading.Thread(
+                target=_run, args=(interval, stop), name='refresh', daemon=True)
+            _thread.stop = stop
+            _thread.start()
+    return _thread
+
+
+def stop():
+    with _lock:
+        if _thread is not None:
+            _thread.stop.set()
@@ -0,0 +1,69 @@
+"""
+Warm-up and readiness routes for App Engine.
+
+    /_ah/warmup   sent before an instance gets traffic (automatic scaling,
+                  needs 'inbound_services: warmup' in app.yaml)
+    /_ah/start    sent when a basic or manual scaling instance starts; it
+                  gets no traffic until this returns
+    /readyz       200 once warm-up has finished, 503 before
+
+Both /_ah handlers run warm_up(): the geometry at every level, the Q1-Q4
+datasets and the default Q1 maps with their geometry subsets, so the first
+visitor is answered from the caches. Under gunicorn the master has usually
+done this before forking and the handlers return straight away. They answer
+200 even when a dataset failed to load, because App Engine would otherwise
+restart the instance in a loop while BigQuery is unreachable. /readyz
+reports the failure.
+"""
+import threading
+import flask
+from apps import prefetch
+from main import server
+
+_ready = threading.Event()
+_lock = threading.Lock()
+_warmed = {}
+
+
+def render_default_figures():
+    """Build the Q1 maps as page1 first shows them: no selection, default zoom"""
+    from apps import figures, geo, page1
+    beats = page1.load_beat_data()
+    level = geo.level_for_zoom(figures.MAP_ZOOM)
+    figures.beat_map(beats['top'], 'TOP_02', level)
+    figures.beat_map(beats['bottom'], 'BOTTOM_02', level, highlight_lines=True)
+
+
+def warm_up() -> dict:
+    """
+    Fill every cache a first visit reads from, once per process.
+
+    Returns the per-dataset timings. The process is ready when every dataset
+    loaded; otherwise the next call tries again.
+    """
+    with _lock:
+        if _ready.is_set():
+            return dict(_warmed)
+        timings = prefetch.warm()
+        if set(timings) == set(prefetch.DATASETS):
+            render_default_figures()
+            _warmed.update(timings)
+            _ready.set()
+        return timings
+
+
+def ready() -> bool:
+    return _ready.is_set()
+
+
+@server.route('/_ah/warmup')
+@server.route('/_ah/start')
+def warmup_handler():
+    timings = warm_up()
+    return flask.jsonify(ready=ready(), loaded=sorted(timings))
+
+
+@server.route('/readyz')
+def readyz():
+    status = 200 if ready() else 503
+    return flask.jsonify(ready=ready(), refreshed=prefetch.refreshed), status
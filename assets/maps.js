@@ -0,0 +1,23 @@
+// Client-side callbacks for the Q1 maps.
+// Highlighting a clicked grid row only changes the trace opacity, so it is
+// done in the browser instead of rebuilding the figure on the server.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    maps: {
+        highlight: function(cell, figure) {
+            if (!cell || !figure || !figure.data || !figure.data.length) {
+                return window.dash_clientside.no_update;
+            }
+            const trace = figure.data[0];
+            const opacity = trace.locations.map(function() { return 0.1; });
+            opacity[cell.rowIndex] = 0.5;
+            const marker = Object.assign({}, trace.marker, {opacity: opacity});
+            // the bottom map also scales its outlines with the selection
+            if (trace.marker && trace.marker.line && Array.isArray(trace.marker.line.width)) {
+                marker.line = Object.assign({}, trace.marker.line, {width: opacity});
+            }
+            const data = figure.data.slice();
+            data[0] = Object.assign({}, trace, {marker: marker});
+            return Object.assign({}, figure, {data: data});
+        }
+    }
+});
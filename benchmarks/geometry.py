@@ -0,0 +1,54 @@
+"""
+Compare the ways of loading the beat geometry at startup.
+
+    python -m benchmarks.geometry [iterations]
+
+Times and measures the Python heap (tracemalloc) of loading the source
+GeoJSON, the full-level TopoJSON and the memory-mapped binary store, then
+of decoding the whole level to GeoJSON from the topology and from the store.
+Run 'python -m apps.geometry build' first.
+"""
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from apps.geometry import GeometryStore, decode_topology, level_path, store_path
+
+NAME = 'police_beats'
+
+
+def _load_json(path):
+    with open(path, mode='r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def measure(load, iterations):
+    gc.collect()
+    tracemalloc.start()
+    value = load()
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        load()
+    return (time.perf_counter() - start) / iterations, heap, value
+
+
+def main(iterations=10):
+    topology = _load_json(level_path(NAME, 'full'))
+    store = GeometryStore(store_path(NAME, 'full'))
+    cases = [
+        ('load source geojson', lambda: _load_json('police_beats.geojson')),
+        ('load topojson', lambda: _load_json(level_path(NAME, 'full'))),
+        ('load binary store', lambda: GeometryStore(store_path(NAME, 'full'))),
+        ('geojson from topojson', lambda: decode_topology(topology, NAME)),
+        ('geojson from store', lambda: store.feature_collection()),
+    ]
+    for label, load in cases:
+        seconds, heap, _ = measure(load, iterations)
+        print(f'{label:<24} {seconds * 1000:8.2f} ms {heap / 2**20:8.2f} MB heap')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
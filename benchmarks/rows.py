@@ -0,0 +1,59 @@
+"""
+Compare the ways of turning a query result into AgGrid rowData.
+
+    python -m benchmarks.rows [iterations]
+
+Both backends produce an Arrow table. 'pandas' is the old path
+(table.to_pandas().to_dict('records')) and 'arrow' is the current one
+(table.to_pylist()). The tables are the Parquet exports under DATA_DIR
+('python -m apps.data export'). Without them, a synthetic table shaped
+like the Q1 results is used.
+"""
+import os
+import random
+import sys
+import timeit
+import pyarrow as pa
+import pyarrow.parquet as pq
+from apps import data
+
+PATHS = {
+    'pandas': lambda table: table.to_pandas().to_dict('records'),
+    'arrow': lambda table: table.to_pylist(),
+}
+
+
+def sample_table(n=250, seed=0):
+    """Q1-shaped table: a district plus two arrays of (beat, arrest rate) structs"""
+    rng = random.Random(seed)
+
+    def beats():
+        return [{'beat': rng.randrange(100, 2600), 'arrest_rate': rng.random() * .4}
+                for _ in range(2)]
+
+    return pa.Table.from_pylist([
+        {'district': rng.randrange(1, 26), 'TOP_02': beats(), 'BOTTOM_02': beats()}
+        for _ in range(n)
+    ])
+
+
+def tables():
+    found = {}
+    for table in data.TABLES:
+        dataset, name = table.split('.')
+        path = os.path.join(data.DATA_DIR, dataset, f'{name}.parquet')
+        if os.path.isfile(path):
+            found[dataset] = pq.read_table(path)
+    return found or {'synthetic Q1': sample_table()}
+
+
+def main(iterations=200):
+    for label, table in tables().items():
+        for path, convert in PATHS.items():
+            seconds = timeit.timeit(lambda: convert(table), number=iterations) / iterations
+            print(f'{label:<52} {path:<7} {table.num_rows:6d} rows '
+                  f'{seconds * 1000:8.3f} ms {seconds / max(table.num_rows, 1) * 1e6:8.2f} us/row')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
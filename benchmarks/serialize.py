@@ -0,0 +1,42 @@
+"""
+Compare the JSON engines on the page1 map figure.
+
+    python -m benchmarks.serialize [iterations]
+
+Times plotly's to_json_plotly (what Dash calls for every response) with the
+'json' and 'orjson' engines on two payloads: the current Q1 map figure,
+which references its geometry by URL, and the same figure with the full beat
+GeoJSON inlined, as page1 used to send it.
+"""
+import random
+import sys
+import timeit
+from plotly.io.json import to_json_plotly
+from apps import figures, geo
+from apps.geometry import decode_topology
+
+
+def sample_rows(n=40, seed=0):
+    rng = random.Random(seed)
+    beats = rng.sample(sorted(geo.feature_index('police_beats')), n)
+    return [{
+        'district': beat[:2],
+        'TOP_02_beat': int(beat),
+        'TOP_02_arrest_rate': rng.random() * .4,
+        'beat_key': beat,
+    } for beat in beats]
+
+
+def main(iterations=50):
+    fig = figures.beat_map(sample_rows(), 'TOP_02', 'low')
+    inlined = dict(fig, data=[dict(fig['data'][0], geojson=decode_topology(
+        geo.topology('police_beats'), 'police_beats'))])
+    for label, payload in [('page1 figure', fig), ('page1 figure + inline geojson', inlined)]:
+        for engine in ['json', 'orjson']:
+            size = len(to_json_plotly(payload, engine=engine))
+            seconds = timeit.timeit(lambda: to_json_plotly(payload, engine=engine), number=iterations)
+            print(f'{label:<32} {engine:<7} {size / 1024:8.0f} KB {seconds / iterations * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
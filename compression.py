@@ -0,0 +1,155 @@
+"""
+Response compression for the Flask server.
+
+Dynamic responses (callbacks, layouts, geometry) are compressed with brotli
+or gzip by Flask-Compress, depending on the client's Accept-Encoding, once
+they are larger than COMPRESS_MIN_SIZE bytes.
+
+Files under assets/ and static/ are compressed ahead of time by
+
+    python -m compression build
+
+which writes .br and .gz files next to the originals. Requests for those
+files are answered with the precompressed variant directly.
+
+Flask-Compress marks the ETag of a response it compresses with the encoding
+('"<etag>:br"'), and browsers send that value back in If-None-Match. The
+suffix is stripped from incoming requests, so conditional responses (the
+/geo routes, send_file) compare against their own ETags and can answer 304.
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.json', '.geojson', '.svg', '.eot', '.otf', '.ttf', '.html', '.txt')
+
+# encoding -> file suffix, in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+
+# ':br' / ':gzip' / ':deflate' that Flask-Compress appends inside an ETag
+_ETAG_ENCODING = re.compile(r':(?:br|gzip|deflate)"')
+
+
+# ---------------------------------------------------------------------
+# Build step
+# ---------------------------------------------------------------------
+
+
+def compress_file(path):
+    """Write .gz (and .br) next to `path` unless they save less than 10%"""
+    with open(path, mode='rb') as f:
+        body = f.read()
+    variants = [('.gz', gzip.compress(body, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(body, quality=11)))
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) > .9 * len(body):
+            continue
+        with open(path + suffix, mode='wb') as f:
+            f.write(compressed)
+        written.append((path + suffix, len(compressed)))
+    return len(body), written
+
+
+def build(folders=('assets', 'static')):
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            for name in files:
+                if not name.endswith(COMPRESSIBLE):
+                    continue
+                path = os.path.join(root, name)
+                if os.path.getsize(path) < MIN_SIZE:
+                    continue
+                size, variants = compress_file(path)
+                if not variants:
+                    continue
+                sizes = ', '.join(f'{p[len(path):]} {s / 1024:.0f} KB' for p, s in variants)
+                print(f'{path}: {size / 1024:.0f} KB -> {sizes}')
+
+
+# ---------------------------------------------------------------------
+# Serving
+# ---------------------------------------------------------------------
+
+
+def strip_etag_encoding(if_none_match: str) -> str:
+    """If-None-Match with the encoding suffixes Flask-Compress adds removed"""
+    return _ETAG_ENCODING.sub('"', if_none_match)
+
+
+def _precompressed(path, accept_encoding):
+    """Return (variant path, encoding) for the best up-to-date variant, or None"""
+    for encoding, suffix in ENCODINGS:
+        variant = path + suffix
+        if encoding in accept_encoding and os.path.isfile(variant) \
+                and os.path.getmtime(variant) >= os.path.getmtime(path):
+            return variant, encoding
+    return None
+
+
+def init_app(server, folders):
+    """
+    Turn on dynamic compression and serve precompressed static files.
+
+    `folders` maps URL prefixes to directories, e.g. {'/assets/': 'assets'}.
+    """
+    import flask
+    from flask_compress import Compress
+    from werkzeug.utils import safe_join
+
+    server.config.setdefault('COMPRESS_ALGORITHM', [encoding for encoding, _ in ENCODINGS])
+    server.config.setdefault('COMPRESS_MIN_SIZE', MIN_SIZE)
+    server.config.setdefault('COMPRESS_MIMETYPES', [
+        'text/html', 'text/css', 'text/javascript', 'application/javascript',
+        'application/json', 'image/svg+xml',
+    ])
+    Compress(server)
+
+    @server.before_request
+    def strip_compressed_etags():
+        environ = flask.request.environ
+        if 'HTTP_IF_NONE_MATCH' in environ:
+            environ['HTTP_IF_NONE_MATCH'] = strip_etag_encoding(environ['HTTP_IF_NONE_MATCH'])
+
+    @server.before_request
+    def serve_precompressed():
+        request = flask.request
+        if request.method != 'GET':
+            return None
+        for prefix, folder in folders.items():
+            if not request.path.startswith(prefix):
+                continue
+            relative = request.path[len(prefix):]
+            path = safe_join(folder, relative)
+            if path is None or not path.endswith(COMPRESSIBLE) or not os.path.isfile(path):
+                return None
+            found = _precompressed(path, request.headers.get('Accept-Encoding', ''))
+            if found is None:
+                return None
+            variant, encoding = found
+            response = flask.send_file(
+                os.path.abspath(variant),
+                mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                conditional=True,
+            )
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+        return None
+
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:] == ['build']:
+        build()
+    else:
+        print('usage: python -m compression build')
@@ -0,0 +1,148 @@
+"""
+Content-hashed URLs and long-lived caching for assets/ and static/.
+
+url('/assets/DATALOGO.jpg') returns the path with ?v=<content hash>. A
+request whose v matches the file's current hash is served with
+Cache-Control: immutable for a year. Any other request (no fingerprint, one
+left over from before a redeploy, or a Dash ?m=<mtime> link) gets
+no-cache and is revalidated against the ETag. An mtime is not a safe
+fingerprint here: deploys normalize file mtimes and the build rewrites
+stylesheets in place, so changed content can keep the same ?m= URL.
+
+Dash links the stylesheets and scripts under assets/ itself, with
+?m=<mtime>. The app turns that off with ASSETS_IGNORE and links them through
+linked_assets() instead, so they get a content hash like everything else.
+
+Stylesheets reference fonts with url(), which the browser resolves without
+going through url(). 'python -m fingerprint build' adds ?v=<hash> to those
+references under assets/.
+"""
+import hashlib
+import os
+import re
+
+ONE_YEAR = 365 * 24 * 60 * 60
+IMMUTABLE = f'public, max-age={ONE_YEAR}, immutable'
+
+# URL prefix -> folder, set by init_app
+FOLDERS = {'/assets/': 'assets', '/static/': 'static'}
+
+# assets Dash should not link itself, see linked_assets()
+ASSETS_IGNORE = r'.*\.(css|js)$'
+
+_hashes = {}
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")?#]+)(\?v=[0-9a-f]*)?\1\s*\)')
+
+
+def content_hash(path: str) -> str:
+    """Short SHA-1 of a file, recomputed whenever its size or mtime changes"""
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _hashes.get(path)
+    if cached is None or cached[0] != key:
+        with open(path, mode='rb') as f:
+            cached = (key, hashlib.sha1(f.read()).hexdigest()[:12])
+        _hashes[path] = cached
+    return cached[1]
+
+
+def _local_path(url_path):
+    for prefix, folder in FOLDERS.items():
+        if url_path.startswith(prefix):
+            path = os.path.normpath(os.path.join(folder, url_path[len(prefix):]))
+            if path.startswith(os.path.normpath(folder) + os.sep) and os.path.isfile(path):
+                return path
+    return None
+
+
+def url(url_path: str) -> str:
+    """`url_path` with its content hash appended, or unchanged if not a local file"""
+    path = _local_path(url_path)
+    if path is None:
+        return url_path
+    return f'{url_path}?v={content_hash(path)}'
+
+
+def linked_assets(folder='assets', prefix='/assets/'):
+    """
+    Content-hashed URLs of the stylesheets and scripts in `folder`, as
+    (stylesheets, scripts), in the order Dash would link them.
+    """
+    stylesheets, scripts = [], []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            relative = os.path.relpath(os.path.join(root, name), folder).replace(os.sep, '/')
+            if name.endswith('.css'):
+                stylesheets.append(url(prefix + relative))
+            elif name.endswith('.js'):
+                scripts.append(url(prefix + relative))
+    return stylesheets, scripts
+
+
+def _is_fingerprinted(path, args):
+    return args.get('v') == content_hash(path)
+
+
+def init_app(server, folders=None):
+    """Set the cache headers for every response served from `folders`"""
+    import flask
+
+    if folders is not None:
+        FOLDERS.clear()
+        FOLDERS.update(folders)
+
+    @server.after_request
+    def cache_headers(response):
+        if response.status_code not in (200, 304):
+            return response
+        path = _local_path(flask.request.path)
+        if path is None:
+            return response
+        if _is_fingerprinted(path, flask.request.args):
+            response.headers['Cache-Control'] = IMMUTABLE
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+# ---------------------------------------------------------------------
+# Build step
+# ---------------------------------------------------------------------
+
+
+def fingerprint_css(css_path):
+    """Add ?v=<hash> to every local url() in a stylesheet; returns the new text"""
+    css_dir = os.path.dirname(css_path)
+
+    def replace(match):
+        quote, target, _ = match.groups()
+        path = os.path.join(css_dir, target)
+        if target.startswith(('http:', 'https:', 'data:', '/')) or not os.path.isfile(path):
+            return match.group(0)
+        return f'url({quote}{target}?v={content_hash(path)}{quote})'
+
+    with open(css_path, mode='r', encoding='utf-8') as f:
+        return _CSS_URL.sub(replace, f.read())
+
+
+def build(folder='assets'):
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.css'):
+            continue
+        css_path = os.path.join(folder, name)
+        with open(css_path, mode='r', encoding='utf-8') as f:
+            css = f.read()
+        rewritten = fingerprint_css(css_path)
+        if rewritten != css:
+            with open(css_path, mode='w', encoding='utf-8') as f:
+                f.write(rewritten)
+            print(f'{css_path}: url() references fingerprinted')
+
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:] == ['build']:
+        build()
+    else:
+        print('usage: python -m fingerprint build')
@@ -0,0 +1,53 @@
+"""
+Gunicorn settings for App Engine.
+
+    gunicorn -c gunicorn.conf.py index:server
+
+The app is imported once in the master (preload_app), which then warms the
+query cache and the parsed geometry before forking. Workers share those
+pages copy-on-write instead of each re-importing, re-parsing and
+re-querying. gc.freeze() keeps the garbage collector from touching, and so
+copying, the shared objects.
+
+The page loads are I/O bound (BigQuery round trips), so each worker runs a
+pool of threads rather than relying on more processes. Each worker also
+runs the background refresh from apps/refresh.py.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+timeout = 120
+keepalive = 5
+
+
+def when_ready(server):
+    from apps import data, prefetch, warmup
+    # the BigQuery Storage client starts gRPC, which must not happen before
+    # fork, so the master pages its warm-up results over REST
+    data.BigQueryBackend.read_api = False
+    timings = warmup.warm_up()
+    server.log.info('warmed caches before fork:\n%s', prefetch.report(timings))
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # client sockets and DuckDB connections must not be shared across a fork,
+    # each worker opens its own backend on first use
+    from apps import data, refresh
+    data.set_backend(None)
+    data.BigQueryBackend.read_api = True
+    # threads do not survive the fork, so each worker starts its own
+    refresh.start()
+
+
+def post_worker_init(worker):
+    # a worker whose master could not warm up (e.g. BigQuery was unreachable)
+    # fills its own cache before taking requests
+    from apps import warmup
+    if not warmup.ready():
+        warmup.warm_up()
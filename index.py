@@ -6,23 +6,32 @@ Main file to run the app.
 
 Auther: Derrick Lewis
 """
+import startup_profile  # first, so STARTUP_PROFILE can time the imports below
+import importlib
 import os
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import flask
 from dotenv import load_dotenv
 from dash import  dcc, html
 from dash.dependencies import Input, Output, State
 import plotly.io as pio
 import dash_bootstrap_components as dbc
-from apps import page3
 from plotly_theme_light import plotly_light
+from optimize_assets import optimized
+import fingerprint
 from main import server, app
-from apps import home, page1, page2, page3, page4
+# modules that register Flask routes must be imported before the first
+# request, Flask refuses new routes after that
+from apps import geo, prefetch, refresh, warmup
 
 pio.templates["plotly_light"] = plotly_light
 pio.templates.default = "plotly_light"
 load_dotenv()
 
 
-COMPANY_LOGO ="DATALOGO.jpg"
+COMPANY_LOGO = optimized("DATALOGO.jpg")
 
 # building the navigation bar
 # https://github.com/facultyai/dash-bootstrap-components/blob/master/examples/advanced-component-usage/Navbars.py
@@ -46,7 +55,7 @@ navbar = dbc.Navbar(
             dbc.Row(
                 [
                     dbc.Col(
-                        html.Img(src=app.get_asset_url(COMPANY_LOGO), height="50px"),
+                        html.Img(src=fingerprint.url(app.get_asset_url(COMPANY_LOGO)), height="50px"),
                          ),
                     dbc.Col(
                         dbc.NavbarBrand("Chicago Crime Statistics",
@@ -137,17 +146,6 @@ app.layout = html.Div([
         'margin-left': '50px'
     }),
     html.Div(
-        [
-            dcc.Markdown(f"""
-                        Updated on
-                        """,
-                             style={
-                                 'font-family': 'plain',
-                                 'color': 'grey',
-                                 'font-weight': 'light',
-                                 'align': 'right'
-                             }),
-        ],
         id='footer', style={
         'margin-top': '250px',
         'margin-right': '70px',
@@ -158,27 +156,88 @@ app.layout = html.Div([
 ] )
 
 
+# Warm every dataset concurrently before serving, rather than on first visit
+if os.environ.get('PREFETCH_ON_STARTUP'):
+    print(prefetch.report(prefetch.prefetch()))
+
+
+@app.callback(Output('footer', 'children'), [Input('url', 'pathname')])
+def update_footer(pathname):
+    """Show when each dataset was last refreshed"""
+    lines = []
+    for name in prefetch.DATASETS:
+        refreshed = prefetch.refreshed.get(name)
+        when = (datetime.fromtimestamp(refreshed, timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+                if refreshed else 'not loaded yet')
+        lines.append(f'{name}: {when}  ')
+    return dcc.Markdown('Updated on  \n' + '\n'.join(lines),
+                        style={
+                            'font-family': 'plain',
+                            'color': 'grey',
+                            'font-weight': 'light',
+                            'align': 'right'
+                        })
+
+
+# pathname -> (page module, layout attribute). A page module is imported,
+# registering its callbacks, the first time one of its paths is requested.
+# Dash callbacks can be added at any time, but Flask setup methods (route,
+# before_request, ...) cannot, so page modules and what they import must
+# not call them; those modules are imported above instead.
+ROUTES = {
+    '/': ('apps.home', 'layout'),
+    '/home': ('apps.home', 'layout'),
+    '/Q1': ('apps.page1', 'layout'),
+    '/Q2': ('apps.page2', 'layout'),
+    '/Q3': ('apps.page3', 'layout'),
+    '/Q4': ('apps.page4', 'layout'),
+}
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def page_layout(pathname):
+    """Layout factory for `pathname`, importing its page on first use, or None"""
+    factory = _layouts.get(pathname)
+    if factory is None and pathname in ROUTES:
+        module, attribute = ROUTES[pathname]
+        with _layouts_lock:
+            layout = getattr(importlib.import_module(module), attribute)
+            # the question pages build their layout per visit, home is static
+            factory = layout if callable(layout) else (lambda: layout)
+            _layouts[pathname] = factory
+    return factory
+
+
+@server.before_request
+def import_page():
+    """
+    Import the page a request belongs to before Dash answers it.
+
+    The browser fetches the callback list (_dash-dependencies) once per page
+    load, so the page's callbacks must be registered by then. Every
+    navigation is a full load (dcc.Location refresh=True), and Dash's own
+    requests name the page in their Referer.
+    """
+    path = flask.request.path
+    if path.startswith('/_dash-'):
+        path = urlparse(flask.request.referrer or '').path
+    if path in ROUTES:
+        page_layout(path)
+
+
 @app.callback(Output('page-content', 'children'), [Input('url', 'pathname')])
 def display_page(pathname):
     """
-    This function is used to route the user to the correct page based on the url
+    This function is used to route the user to the correct page based on the url.
     """
-    print(pathname)
-    if pathname == '/':
-        return home.layout
-    elif pathname == '/home':
-        return home.layout
-    elif pathname == '/Q1':
-        return page1.layout
-    elif pathname == '/Q2':
-        return page2.layout
-    elif pathname == '/Q3':
-        return page3.layout
-    elif pathname == '/Q4':
-        return page4.layout
-    else:
+    factory = page_layout(pathname)
+    if factory is None:
         return '404'
+    return factory()
 
 
 if __name__ == '__main__':
+    refresh.start()
     app.run_server(host='0.0.0.0', debug=True)
\ No newline at end of file
@@ -1,14 +1,24 @@
 #!/bin/bash
 import dash
 import dash_bootstrap_components as dbc
+import compression
+import fingerprint
+import serializer
+import startup_profile
 
 
-# bootstrap theme
-external_stylesheets = [dbc.themes.BOOTSTRAP]
+# assets/*.css and *.js are linked here with a content hash rather than by
+# Dash with ?m=<mtime>, so they can be cached as immutable
+asset_stylesheets, asset_scripts = fingerprint.linked_assets()
+
+# bootstrap theme, then the local stylesheets
+external_stylesheets = [dbc.themes.BOOTSTRAP, *asset_stylesheets]
 
 
 app = dash.Dash(__name__,
                 external_stylesheets=external_stylesheets,
+                external_scripts=asset_scripts,
+                assets_ignore=fingerprint.ASSETS_IGNORE,
                 meta_tags=[{
                     "name": "viewport",
                     "content": "width=device-width"
@@ -16,4 +26,22 @@ app = dash.Dash(__name__,
 
 server = app.server
 
+# encoder used for every callback and layout response
+serializer.configure()
+
+# URL prefix -> folder for the files served as-is
+STATIC_FOLDERS = {
+    '/assets/': app.config.assets_folder,
+    '/static/': server.static_folder,
+}
+
+# brotli/gzip for dynamic responses, precompressed files for assets and static
+compression.init_app(server, STATIC_FOLDERS)
+
+# immutable caching for content-hashed asset URLs
+fingerprint.init_app(server, STATIC_FOLDERS)
+
+# STARTUP_PROFILE report, written after the first request
+startup_profile.init_app(server)
+
 app.config.suppress_callback_exceptions = True
\ No newline at end of file
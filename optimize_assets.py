@@ -0,0 +1,156 @@
+"""
+Build step that shrinks the fonts and images the pages load.
+
+    python -m optimize_assets build
+
+Fonts: every font referenced by an @font-face rule under assets/ is subset
+to the Latin ranges the pages use and saved as WOFF2 (fontTools). The rule
+is rewritten to try the WOFF2 first and fall back to the original file, so
+the CSS stays valid before the fonts are built.
+
+Images: each file in IMAGES is resized to the largest size it is rendered at
+(2x for high-DPI screens) and re-encoded as WebP (Pillow). optimized() gives
+the pages the WebP when it has been built and the original otherwise.
+"""
+import os
+import re
+
+ASSETS = 'assets'
+
+# Basic Latin, Latin-1 and general punctuation
+UNICODES = [*range(0x20, 0x7f), *range(0xa0, 0x100), *range(0x2010, 0x2028), 0x2022, 0x2026, 0x20ac]
+
+# image -> largest rendered width in CSS pixels
+IMAGES = {
+    os.path.join('assets', 'DATALOGO.jpg'): 50,
+    os.path.join('static', 'images', 'channel.png'): 512,
+}
+
+FORMATS = {'.otf': 'opentype', '.ttf': 'truetype', '.woff': 'woff', '.woff2': 'woff2'}
+
+_FONT_FACE = re.compile(r'@font-face\s*{[^}]*}', re.IGNORECASE)
+_SRC = re.compile(r'src:\s*[^;]*;', re.IGNORECASE)
+_URL = re.compile(r'url\(\s*[\'"]?([^\'")]+)[\'"]?\s*\)')
+
+
+# ---------------------------------------------------------------------
+# Fonts
+# ---------------------------------------------------------------------
+
+
+def _resolve(css_dir, url):
+    """Path of a url() on disk, relative to the stylesheet or the project"""
+    url = url.split('?')[0]
+    for path in (os.path.join(css_dir, url), url):
+        if os.path.isfile(path):
+            return os.path.normpath(path)
+    return None
+
+
+def font_sources(block, css_dir):
+    """Original (non-WOFF2) font files referenced by an @font-face block"""
+    paths = []
+    for url in _URL.findall(block):
+        path = _resolve(css_dir, url)
+        if path and not path.endswith('.woff2') and path not in paths:
+            paths.append(path)
+    return paths
+
+
+def subset_font(path):
+    from fontTools import subset
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['*']
+    font = subset.load_font(path, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=UNICODES)
+    subsetter.subset(font)
+    out = os.path.splitext(path)[0] + '.woff2'
+    subset.save_font(font, out, options)
+    return out
+
+
+def rewrite_font_face(block, css_dir):
+    """@font-face block with a WOFF2 source ahead of the original"""
+    sources = font_sources(block, css_dir)
+    if not sources:
+        return block
+    original = sources[0]
+    woff2 = os.path.splitext(original)[0] + '.woff2'
+    urls = []
+    for path in (woff2, original):
+        fmt = FORMATS.get(os.path.splitext(path)[1], 'opentype')
+        urls.append(f'url({os.path.relpath(path, css_dir)}) format("{fmt}")')
+    block = _SRC.sub(lambda _: 'src: ' + ',\n         '.join(urls) + ';', block)
+    if 'font-display' not in block:
+        block = block.rstrip('}').rstrip() + '\n    font-display: swap;\n}'
+    return block
+
+
+def build_fonts(folder=ASSETS):
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.css'):
+            continue
+        css_path = os.path.join(folder, name)
+        with open(css_path, mode='r', encoding='utf-8') as f:
+            css = f.read()
+        for block in _FONT_FACE.findall(css):
+            for path in font_sources(block, folder):
+                out = subset_font(path)
+                print(f'{path}: {os.path.getsize(path) / 1024:.0f} KB -> '
+                      f'{out} {os.path.getsize(out) / 1024:.0f} KB')
+        rewritten = _FONT_FACE.sub(lambda m: rewrite_font_face(m.group(0), folder), css)
+        if rewritten != css:
+            with open(css_path, mode='w', encoding='utf-8') as f:
+                f.write(rewritten)
+            print(f'{css_path}: @font-face rewritten')
+
+
+# ---------------------------------------------------------------------
+# Images
+# ---------------------------------------------------------------------
+
+
+def webp_path(path):
+    return os.path.splitext(path)[0] + '.webp'
+
+
+def build_images(images=IMAGES, scale=2, quality=80):
+    from PIL import Image
+    for path, width in images.items():
+        with Image.open(path) as image:
+            target = min(image.width, width * scale)
+            if image.width > target:
+                height = round(image.height * target / image.width)
+                image = image.resize((target, height), Image.LANCZOS)
+            out = webp_path(path)
+            image.save(out, 'WEBP', quality=quality, method=6)
+        print(f'{path}: {os.path.getsize(path) / 1024:.0f} KB -> '
+              f'{out} {os.path.getsize(out) / 1024:.0f} KB')
+
+
+def optimized(path: str) -> str:
+    """
+    Name of the WebP copy of `path` if it has been built, else `path`.
+
+    `path` is as the page uses it ('DATALOGO.jpg' for an asset, or
+    '/static/images/channel.png').
+    """
+    on_disk = path.lstrip('/') if path.startswith('/') else os.path.join(ASSETS, path)
+    if os.path.isfile(webp_path(on_disk)):
+        return webp_path(path)
+    return path
+
+
+def build():
+    build_fonts()
+    build_images()
+
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:] == ['build']:
+        build()
+    else:
+        print('usage: python -m optimize_assets build')
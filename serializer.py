@@ -0,0 +1,32 @@
+"""
+JSON serialization for the Dash server.
+
+Dash encodes callback and layout responses with plotly.io.json.to_json_plotly,
+which uses plotly's configured JSON engine, so configure() picks the encoder
+for figures, rowData and layouts in one place. JSON_ENGINE selects it:
+'orjson' (the default when installed) or the standard library 'json'.
+
+dumps() is for static structures, such as the geometry, that are serialized
+once and then served as bytes.
+"""
+import json
+import os
+import plotly.io as pio
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENGINE = os.environ.get('JSON_ENGINE', 'orjson' if orjson else 'json')
+
+
+def configure(engine=ENGINE):
+    pio.json.config.default_engine = engine
+
+
+def dumps(value) -> bytes:
+    """Serialize plain JSON data (dicts, lists, strings, numbers) to bytes"""
+    if ENGINE == 'orjson' and orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
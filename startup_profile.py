@@ -0,0 +1,261 @@
+"""
+Cold-start profiling, from process start to the first served request.
+
+Set STARTUP_PROFILE to a report path to turn it on:
+
+    STARTUP_PROFILE=startup.json gunicorn -c gunicorn.conf.py index:server
+    STARTUP_PROFILE=startup.json python index.py
+
+Importing this module starts the profiler, so index.py imports it before
+anything else. The time from process start up to then (the interpreter and
+gunicorn itself) is the 'interpreter' phase. After that it records a phase
+for each import of a module in IMPORTS (inclusive of what that module
+imports) and for every `with phase(name):` block in the app (geometry,
+dataset loads, queries). Each phase has its offset from process start, wall
+and CPU time, and the change in resident memory. With
+STARTUP_PROFILE_TRACEMALLOC=1 it also records Python allocations, which
+slows the imports down noticeably.
+
+The report is written as JSON when the first request has been served. A
+'{pid}' in the path keeps one report per gunicorn worker. To check a report
+against a budget (exit status 1 if over):
+
+    python -m startup_profile check startup.json [startup_budget.json]
+"""
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPORT = os.environ.get('STARTUP_PROFILE', '')
+TRACEMALLOC = os.environ.get('STARTUP_PROFILE_TRACEMALLOC') == '1'
+BUDGET = 'startup_budget.json'
+
+# modules whose import is timed as its own phase
+IMPORTS = (
+    'flask', 'dash', 'plotly', 'pandas', 'numpy', 'pyarrow', 'duckdb',
+    'google.cloud.bigquery', 'google.cloud.bigquery_storage',
+    'dash_ag_grid', 'dash_bootstrap_components',
+    'main', 'apps.home', 'apps.page1', 'apps.page2', 'apps.page3', 'apps.page4',
+    'apps.geo', 'apps.data',
+)
+
+phases = []
+_lock = threading.Lock()
+_local = threading.local()
+_started = None
+_reported = False
+
+
+def _process_start() -> float:
+    """Epoch time the process started (Linux), or now if unknown"""
+    try:
+        with open('/proc/self/stat', mode='r') as f:
+            # the command name may contain spaces, fields resume after ')'
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        # btime in /proc/stat is whole seconds, uptime is to the centisecond
+        with open('/proc/uptime', mode='r') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+def _rss_mb() -> float:
+    """Current resident set size in MB (Linux), else the peak"""
+    try:
+        with open('/proc/self/statm', mode='r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return 0.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return peak / (2**20 if sys.platform == 'darwin' else 2**10)
+
+
+def _since_start() -> float:
+    return (time.time() - _started) * 1000
+
+
+@contextlib.contextmanager
+def phase(name: str):
+    """Record the block as a startup phase; a no-op unless profiling"""
+    if _started is None or _reported:
+        yield
+        return
+    import tracemalloc
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+    start, wall, cpu, rss = _since_start(), time.perf_counter(), time.process_time(), _rss_mb()
+    allocated = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+    try:
+        yield
+    finally:
+        _local.depth = depth
+        record = {
+            'name': name,
+            'start_ms': round(start, 1),
+            'duration_ms': round((time.perf_counter() - wall) * 1000, 1),
+            'cpu_ms': round((time.process_time() - cpu) * 1000, 1),
+            'rss_mb': round(_rss_mb(), 1),
+            'rss_delta_mb': round(_rss_mb() - rss, 1),
+            'depth': depth,
+            'thread': threading.current_thread().name,
+        }
+        if allocated is not None:
+            record['alloc_delta_mb'] = round((tracemalloc.get_traced_memory()[0] - allocated) / 2**20, 1)
+        with _lock:
+            phases.append(record)
+
+
+class _ImportTimer:
+    """Meta path finder that wraps the loading of IMPORTS in a phase"""
+
+    def __init__(self):
+        self._finding = set()
+
+    def find_spec(self, name, path=None, target=None):
+        if name not in IMPORTS or name in self._finding:
+            return None
+        self._finding.add(name)
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding.discard(name)
+        # builtin and frozen importers are classes shared by every module
+        if spec.loader is None or isinstance(spec.loader, type) \
+                or not hasattr(spec.loader, 'exec_module'):
+            return spec
+        exec_module = spec.loader.exec_module
+
+        def timed(module):
+            with phase(f'import {name}'):
+                exec_module(module)
+
+        spec.loader.exec_module = timed
+        return spec
+
+
+def start():
+    """Start profiling this process; called on import when STARTUP_PROFILE is set"""
+    global _started
+    if _started is not None:
+        return
+    _started = _process_start()
+    if TRACEMALLOC:
+        import tracemalloc
+        tracemalloc.start()
+    sys.meta_path.insert(0, _ImportTimer())
+    phases.append({
+        'name': 'interpreter',
+        'start_ms': 0.,
+        'duration_ms': round(_since_start(), 1),
+        'cpu_ms': round(time.process_time() * 1000, 1),
+        'rss_mb': round(_rss_mb(), 1),
+        'rss_delta_mb': round(_rss_mb(), 1),
+        'depth': 0,
+        'thread': threading.current_thread().name,
+    })
+
+
+def report(path: str = None) -> dict:
+    data = {
+        'pid': os.getpid(),
+        'python': sys.version.split()[0],
+        'process_start': _started,
+        'first_request_ms': round(_since_start(), 1),
+        'rss_mb': round(_rss_mb(), 1),
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'phases': sorted(phases, key=lambda p: p['start_ms']),
+    }
+    if path:
+        with open(path.format(pid=os.getpid()), mode='w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+    return data
+
+
+def init_app(server):
+    """Write the report once this process has served its first request"""
+    if _started is None:
+        return
+
+    @server.teardown_request
+    def first_request(exc=None):
+        global _reported
+        with _lock:
+            if _reported:
+                return
+            _reported = True
+        report(REPORT)
+
+
+# ---------------------------------------------------------------------
+# Budget check
+# ---------------------------------------------------------------------
+
+
+def check(report_data: dict, budget: dict) -> list:
+    """
+    Compare a report with a budget; returns a message per overrun.
+
+    `budget` may set 'first_request_ms', 'peak_rss_mb' and 'phases', a map
+    of phase name -> total ms across every occurrence of that phase.
+    """
+    problems = []
+    for key in ('first_request_ms', 'peak_rss_mb'):
+        if key in budget and report_data[key] > budget[key]:
+            problems.append(f'{key}: {report_data[key]} > {budget[key]}')
+    totals = {}
+    for p in report_data['phases']:
+        totals[p['name']] = totals.get(p['name'], 0) + p['duration_ms']
+    for name, limit in budget.get('phases', {}).items():
+        if totals.get(name, 0) > limit:
+            problems.append(f'{name}: {totals[name]:.1f} ms > {limit} ms')
+    return problems
+
+
+def _main(argv):
+    if len(argv) not in (2, 3) or argv[0] != 'check':
+        print('usage: python -m startup_profile check REPORT [BUDGET]')
+        return 2
+    with open(argv[1], mode='r', encoding='utf-8') as f:
+        report_data = json.load(f)
+    with open(argv[2] if len(argv) == 3 else BUDGET, mode='r', encoding='utf-8') as f:
+        budget = json.load(f)
+    for p in report_data['phases']:
+        print(f"{'  ' * p['depth']}{p['name']:<{40 - 2 * p['depth']}} "
+              f"{p['start_ms']:9.1f} {p['duration_ms']:9.1f} ms {p['rss_delta_mb']:+7.1f} MB")
+    print(f"{'first request':<40} {report_data['first_request_ms']:9.1f} ms, "
+          f"peak RSS {report_data['peak_rss_mb']:.1f} MB")
+    problems = check(report_data, budget)
+    for problem in problems:
+        print(f'over budget: {problem}')
+    return 1 if problems else 0
+
+
+if REPORT and __name__ != '__main__':
+    start()
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))